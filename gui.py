@@ -1,12 +1,36 @@
 import os
+import atexit
+import importlib
+import tempfile
 import tkinter as tk
 from tkinter import ttk, scrolledtext, filedialog, messagebox
-from PIL import Image, ImageTk
 import threading
+import concurrent.futures
+from collections import OrderedDict
+from hashlib import blake2b
+
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
 
 from scanner import Scanner
-from parser import Parser
-from visualizer import SyntaxTreeVisualizer
+from parser import Parser, Program, StmtSequence, WriteStmt, Factor
+
+# Number of distinct sources whose scan/parse results are kept around
+AST_CACHE_SIZE = 16
+
+# Number of rendered syntax tree images kept around
+RENDER_CACHE_SIZE = 8
+
+def source_key(code):
+    """
+    Return a short content hash of the source code, used as a cache key.
+    """
+    data = code.encode()
+    if xxhash is not None:
+        return xxhash.xxh64_digest(data)
+    return blake2b(data, digest_size=8).digest()
 
 class TinyCompilerGUI:
     def __init__(self, root):
@@ -17,10 +41,83 @@ class TinyCompilerGUI:
         
         self.scanner = Scanner()
         self.parser = Parser()
-        self.visualizer = SyntaxTreeVisualizer()
+        # Created on first use, along with the PIL import, to keep startup fast.
+        # The lock serializes rendering, since matplotlib is not thread-safe
+        self.visualizer = None
+        self._visualizer_lock = threading.Lock()
+        
+        # Name of the PIL resampling filter used to fit the tree to the canvas.
+        # BILINEAR is plenty for an on-screen preview; "LANCZOS" gives the best
+        # quality at several times the cost
+        self.resample_filter = "BILINEAR"
+        
+        # LRU cache of source hash -> (token values, token types, success, result)
+        self._ast_cache = OrderedDict()
+        
+        # LRU cache of syntax tree hash -> decoded image
+        self._render_cache = OrderedDict()
+        
+        # Number of the latest compile whose tree is to be shown; a slower
+        # rendering from an earlier compile must not replace it. The lock
+        # guards this, the render cache and the displayed image
+        self._render_generation = 0
+        self._display_lock = threading.Lock()
+        
+        # Displayed syntax tree image, reused while its size does not change
+        self.photo_image = None
+        
+        # Only the latest rendering is kept on disk, in the temp directory
+        self._last_tree_file = None
+        atexit.register(self._remove_tree_file)
+        
+        # Scanning and parsing run here so the Tk event loop stays responsive
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        
+        # Whether the code was edited since the last compile, and the source
+        # hash of that compile; lets an unchanged buffer skip reading and hashing
+        self._code_dirty = True
+        self._last_source_key = None
         
         self.setup_ui()
         
+        # Load the visualization stack in the background while the user is
+        # still typing, so the first compile does not pay for it
+        threading.Thread(target=self._warm_up_visualizer, daemon=True).start()
+        
+    def _get_visualizer(self):
+        """
+        Return the syntax tree visualizer, creating it on first use.
+        Must be called with _visualizer_lock held.
+        """
+        if self.visualizer is None:
+            from visualizer import SyntaxTreeVisualizer
+            self.visualizer = SyntaxTreeVisualizer()
+        return self.visualizer
+        
+    def _warm_up_visualizer(self):
+        """
+        Import PIL and the visualizer and render a trivial tree to a
+        temporary file, which is then discarded.
+        """
+        tree = Program(StmtSequence([WriteStmt(Factor(('0', 'NUMBER')))]))
+        output_file = os.path.join(tempfile.gettempdir(), f"tiny_warmup_{os.getpid()}")
+        
+        try:
+            # Only load the modules, ahead of the first compile
+            importlib.import_module("PIL.Image")
+            importlib.import_module("PIL.ImageTk")
+            
+            with self._visualizer_lock:
+                output_path = self._get_visualizer().visualize_async(tree, output_file).result()
+            if output_path is None:
+                # Visualization is disabled
+                return
+            os.remove(output_path)
+            os.remove(f"{output_file}.hash")
+        except Exception:
+            # Best effort only; a real failure is reported on the first compile
+            pass
+        
     def setup_ui(self):
         # Create a main frame
         main_frame = ttk.Frame(self.root)
@@ -41,12 +138,13 @@ class TinyCompilerGUI:
         load_button = ttk.Button(button_frame, text="Load File", command=self.load_file)
         load_button.pack(side=tk.LEFT, padx=5)
         
-        compile_button = ttk.Button(button_frame, text="Compile", command=self.compile_code)
-        compile_button.pack(side=tk.LEFT, padx=5)
+        self.compile_button = ttk.Button(button_frame, text="Compile", command=self.compile_code)
+        self.compile_button.pack(side=tk.LEFT, padx=5)
         
         # Create a text area for code input
         self.code_text = scrolledtext.ScrolledText(main_frame, height=10)
         self.code_text.pack(fill=tk.X, pady=(0, 10))
+        self.code_text.bind("<<Modified>>", self._on_code_modified)
         
         # Create a notebook for the output
         self.output_notebook = ttk.Notebook(main_frame)
@@ -78,6 +176,13 @@ class TinyCompilerGUI:
         self.statusbar = ttk.Label(self.root, textvariable=self.status_var, relief=tk.SUNKEN, anchor=tk.W)
         self.statusbar.pack(side=tk.BOTTOM, fill=tk.X)
         
+    def _on_code_modified(self, event=None):
+        """
+        Mark the code as edited and re-arm the Text widget's modified flag.
+        """
+        self._code_dirty = True
+        self.code_text.edit_modified(False)
+        
     def load_file(self):
         """
         Load a file containing TINY code.
@@ -101,32 +206,78 @@ class TinyCompilerGUI:
     def compile_code(self):
         """
         Compile the TINY code: scan, parse, and visualize.
+        Scanning and parsing happen on a worker thread; the results are
+        displayed by _on_compiled once they are ready.
         """
-        code = self.code_text.get(1.0, tk.END).strip()
+        if self._code_dirty or self._last_source_key not in self._ast_cache:
+            # Read the text straight through Tcl; "end-1c" leaves out the
+            # newline Tk always appends. Surrounding whitespace is left for
+            # the scanner to skip.
+            code = self.code_text.tk.call(str(self.code_text), 'get', '1.0', 'end-1c')
+            
+            if not code or code.isspace():
+                messagebox.showwarning("Warning", "No code to compile.")
+                return
+            
+            self._last_source_key = source_key(code)
+            self._code_dirty = False
         
-        if not code:
-            messagebox.showwarning("Warning", "No code to compile.")
+        key = self._last_source_key
+        cached = self._ast_cache.get(key)
+        
+        if cached is not None:
+            # Unchanged source, reuse the previous scan/parse results
+            self._ast_cache.move_to_end(key)
+            self.show_results(*cached)
             return
         
+        # Update status
+        self.status_var.set("Compiling...")
+        self.compile_button.config(state=tk.DISABLED)
+        
+        future = self._executor.submit(self._compile_worker, code)
+        future.add_done_callback(lambda f: self.root.after(0, self._on_compiled, key, f))
+    
+    def _compile_worker(self, code):
+        """
+        Scan and parse the code and return (values, types, success, result).
+        Runs on the executor thread, so it must not touch any Tk widgets.
+        """
+        values, types = self.scanner.scan_columns(code)
+        success, result = self.parser.parse_columns(values, types)
+        return values, types, success, result
+    
+    def _on_compiled(self, key, future):
+        """
+        Handle a finished compilation on the Tk thread.
+        """
+        self.compile_button.config(state=tk.NORMAL)
+        
         try:
-            # Update status
-            self.status_var.set("Scanning...")
-            self.root.update_idletasks()
-            
-            # Scan the code
-            tokens = self.scanner.scan(code)
-            
-            # Display tokens
+            values, types, success, result = future.result()
+        except Exception as e:
+            messagebox.showerror("Error", f"Compilation error: {e}")
+            self.status_var.set(f"Compilation failed: {e}")
+            return
+        
+        self._ast_cache[key] = (values, types, success, result)
+        if len(self._ast_cache) > AST_CACHE_SIZE:
+            self._ast_cache.popitem(last=False)
+        
+        self.show_results(values, types, success, result)
+    
+    def show_results(self, values, types, success, result):
+        """
+        Display the tokens and the parse result, and start visualizing the
+        syntax tree if the syntax is correct.
+        """
+        try:
+            # Display tokens, built as one string so the widget is only updated once
             self.tokens_text.delete(1.0, tk.END)
-            for i, (token_value, token_type) in enumerate(tokens):
-                self.tokens_text.insert(tk.END, f"{i+1}. {token_value},{token_type}\n")
-            
-            # Update status
-            self.status_var.set("Parsing...")
-            self.root.update_idletasks()
-            
-            # Parse the code
-            success, result = self.parser.parse(tokens)
+            self.tokens_text.insert(tk.END, "".join(
+                f"{i+1}. {token_value},{token_type}\n"
+                for i, (token_value, token_type) in enumerate(zip(values, types))
+            ))
             
             if success:
                 # Update tree status
@@ -137,7 +288,10 @@ class TinyCompilerGUI:
                 self.root.update_idletasks()
                 
                 # Visualize the syntax tree in a separate thread
-                threading.Thread(target=self.visualize_tree, args=(result,)).start()
+                with self._display_lock:
+                    self._render_generation += 1
+                    generation = self._render_generation
+                threading.Thread(target=self.visualize_tree, args=(result, generation)).start()
                 
                 # Switch to the syntax tree tab
                 self.output_notebook.select(1)  # Index 1 is the syntax tree tab
@@ -158,26 +312,61 @@ class TinyCompilerGUI:
             messagebox.showerror("Error", f"Compilation error: {e}")
             self.status_var.set(f"Compilation failed: {e}")
     
-    def visualize_tree(self, tree):
+    def visualize_tree(self, tree, generation):
         """
-        Visualize the syntax tree and display it in the GUI.
+        Visualize the syntax tree and display it in the GUI, unless a later
+        compile (with a higher generation number) has superseded it.
         """
         try:
-            # Generate a unique filename for the syntax tree image
-            import time
-            timestamp = int(time.time())
-            output_file = f"syntax_tree_{timestamp}"
-            
-            # Visualize the tree
-            output_path = self.visualizer.visualize(tree, output_file)
+            from PIL import Image, ImageTk
             
-            # Load the image
-            image = Image.open(output_path)
-            
-            # Resize image to fit the canvas if needed
             canvas_width = self.tree_canvas.winfo_width()
             canvas_height = self.tree_canvas.winfo_height()
             
+            key = blake2b(repr(tree).encode(), digest_size=8).digest()
+            with self._display_lock:
+                cached = self._render_cache.get(key)
+                if cached is not None:
+                    self._render_cache.move_to_end(key)
+            
+            if cached is not None:
+                # Same tree as a previous compile, skip rendering
+                image = cached
+            else:
+                # Generate a unique filename for the syntax tree image
+                with tempfile.NamedTemporaryFile(suffix=".png", delete=False) as file:
+                    output_file = file.name[:-len(".png")]
+                
+                # Visualize the tree, and load the image before releasing the
+                # lock, as the next render deletes this file
+                try:
+                    with self._visualizer_lock:
+                        output_path = self._get_visualizer().visualize_async(tree, output_file).result()
+                        if output_path is not None:
+                            image = Image.open(output_path)
+                            if canvas_width > 1 and canvas_height > 1:
+                                # Let the decoder produce a reduced image directly
+                                # where the format supports it (a no-op for PNG)
+                                image.draft(None, (canvas_width, canvas_height))
+                            image.load()
+                        self._remove_tree_file()
+                        self._last_tree_file = output_path
+                except Exception:
+                    self._remove_image_files(file.name)
+                    raise
+                
+                if output_path is None:
+                    # Visualization is disabled through TINY_DISABLE_VIZ
+                    os.remove(file.name)
+                    self.status_var.set("Syntax tree visualization is disabled.")
+                    return
+                
+                with self._display_lock:
+                    self._render_cache[key] = image
+                    if len(self._render_cache) > RENDER_CACHE_SIZE:
+                        self._render_cache.popitem(last=False)
+            
+            # Resize image to fit the canvas if needed
             if canvas_width > 1 and canvas_height > 1:
                 # Calculate the scaling factor to fit the image in the canvas
                 img_width, img_height = image.size
@@ -188,24 +377,53 @@ class TinyCompilerGUI:
                 if scale < 1:
                     new_width = int(img_width * scale)
                     new_height = int(img_height * scale)
-                    image = image.resize((new_width, new_height), Image.Resampling.LANCZOS)
-            
-            # Convert to PhotoImage for display
-            self.photo_image = ImageTk.PhotoImage(image)
-            
-            # Display the image
-            self.tree_canvas.delete("all")
-            self.tree_canvas.create_image(0, 0, anchor=tk.NW, image=self.photo_image)
+                    image = image.resize((new_width, new_height), getattr(Image.Resampling, self.resample_filter))
             
-            # Configure canvas scrolling if the image is larger than the canvas
-            self.tree_canvas.config(scrollregion=self.tree_canvas.bbox(tk.ALL))
-            
-            # Update status
-            self.status_var.set("Syntax tree visualization completed.")
+            with self._display_lock:
+                if generation != self._render_generation:
+                    # A later compile's tree is (or will be) shown instead
+                    return
+                
+                # Convert to PhotoImage for display, pasting into the existing one
+                # when possible so Tk can keep its image buffer
+                if self.photo_image is not None and (self.photo_image.width(), self.photo_image.height()) == image.size:
+                    self.photo_image.paste(image)
+                else:
+                    self.photo_image = ImageTk.PhotoImage(image)
+                
+                # Display the image
+                self.tree_canvas.delete("all")
+                self.tree_canvas.create_image(0, 0, anchor=tk.NW, image=self.photo_image)
+                
+                # Configure canvas scrolling if the image is larger than the canvas
+                self.tree_canvas.config(scrollregion=self.tree_canvas.bbox(tk.ALL))
+                
+                # Update status
+                self.status_var.set("Syntax tree visualization completed.")
             
         except Exception as e:
             messagebox.showerror("Error", f"Failed to visualize syntax tree: {e}")
             self.status_var.set(f"Visualization failed: {e}")
+    
+    def _remove_tree_file(self):
+        """
+        Delete the most recently rendered syntax tree image file, if any.
+        """
+        if self._last_tree_file is not None:
+            self._remove_image_files(self._last_tree_file)
+            self._last_tree_file = None
+    
+    def _remove_image_files(self, image_path):
+        """
+        Delete a syntax tree image file along with the fingerprint file the
+        visualizer writes next to it, ignoring files that are already gone.
+        """
+        hash_file = os.path.splitext(image_path)[0] + ".hash"
+        for path in (image_path, hash_file):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
 
 if __name__ == "__main__":
     root = tk.Tk()
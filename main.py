@@ -5,6 +5,7 @@ This module serves as the main entry point for the TINY compiler application.
 It launches the GUI interface for the TINY compiler.
 """
 
+import multiprocessing
 import tkinter as tk
 from gui import TinyCompilerGUI
 
@@ -17,4 +18,6 @@ def main():
     root.mainloop()
 
 if __name__ == "__main__":
+    # Needed for the syntax tree rendering process in frozen (PyInstaller) builds
+    multiprocessing.freeze_support()
     main() 
\ No newline at end of file
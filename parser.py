@@ -20,60 +20,311 @@ mulop -> * | /
 factor -> (exp) | number | identifier
 """
 
+# Sentinel appended to the token list so the parser never runs off its end
+EOF_TOKEN = ('', 'EOF')
+
+class Node:
+    """
+    Base class for syntax tree nodes.
+    Each subclass names its fields in __slots__ (in constructor order) and its
+    grammar rule in `type`.
+    """
+    __slots__ = ()
+    type = None
+    
+    def __eq__(self, other):
+        return type(self) is type(other) and all(
+            getattr(self, name) == getattr(other, name) for name in self.__slots__
+        )
+        
+    def __repr__(self):
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"{type(self).__name__}({fields})"
+
+class Program(Node):
+    __slots__ = ('body',)
+    type = 'program'
+    
+    def __init__(self, body):
+        self.body = body
+
+class StmtSequence(Node):
+    __slots__ = ('statements',)
+    type = 'stmt_sequence'
+    
+    def __init__(self, statements):
+        self.statements = statements
+
+class IfStmt(Node):
+    __slots__ = ('condition', 'body')
+    type = 'if_stmt'
+    
+    def __init__(self, condition, body):
+        self.condition = condition
+        self.body = body
+
+class RepeatStmt(Node):
+    __slots__ = ('body', 'condition')
+    type = 'repeat_stmt'
+    
+    def __init__(self, body, condition):
+        self.body = body
+        self.condition = condition
+
+class AssignStmt(Node):
+    __slots__ = ('identifier', 'value')
+    type = 'assign_stmt'
+    
+    def __init__(self, identifier, value):
+        self.identifier = identifier
+        self.value = value
+
+class ReadStmt(Node):
+    __slots__ = ('identifier',)
+    type = 'read_stmt'
+    
+    def __init__(self, identifier):
+        self.identifier = identifier
+
+class WriteStmt(Node):
+    __slots__ = ('value',)
+    type = 'write_stmt'
+    
+    def __init__(self, value):
+        self.value = value
+
+class Exp(Node):
+    __slots__ = ('left', 'op', 'right')
+    type = 'exp'
+    
+    def __init__(self, left, op, right):
+        self.left = left
+        self.op = op
+        self.right = right
+
+class SimpleExp(Node):
+    __slots__ = ('left', 'op', 'right')
+    type = 'simple_exp'
+    
+    def __init__(self, left, op, right):
+        self.left = left
+        self.op = op
+        self.right = right
+
+class Term(Node):
+    __slots__ = ('left', 'op', 'right')
+    type = 'term'
+    
+    def __init__(self, left, op, right):
+        self.left = left
+        self.op = op
+        self.right = right
+
+class Factor(Node):
+    __slots__ = ('value',)
+    type = 'factor'
+    
+    def __init__(self, value):
+        self.value = value
+
 class Parser:
     def __init__(self):
-        self.tokens = []
+        # Tokens are stored as two parallel lists, so the hot path only
+        # has to index the list of types
+        self.token_values = []
+        self.token_types = []
         self.current_token_index = 0
-        self.current_token = None
+        self.current_type = None
         self.syntax_tree = None
+        # Top-level statement subtrees from the previous parse, keyed by
+        # the (values, types) tuples of the tokens they were parsed from
+        self._stmt_cache = {}
+        # (values, types, statements) of the last full parse, turned into
+        # _stmt_cache entries only once a second parse can reuse them
+        self._last_parse = None
+        
+    @property
+    def current_token(self):
+        """
+        The current token as a (token_value, token_type) tuple.
+        """
+        i = self.current_token_index
+        return (self.token_values[i], self.token_types[i])
         
     def parse(self, tokens):
         """
         Parse the tokens and return True if the syntax is correct, False otherwise.
         Also constructs the syntax tree.
         """
-        self.tokens = tokens
-        self.current_token_index = 0
-        self.current_token = self.tokens[0] if self.tokens else None
+        values = [token_value for token_value, token_type in tokens]
+        types = [token_type for token_value, token_type in tokens]
+        return self.parse_columns(values, types)
         
-        try:
-            # Start parsing from the program rule
-            self.syntax_tree = self.program()
+    def parse_columns(self, values, types):
+        """
+        Same as parse(), but takes the token values and types as two parallel
+        lists, as returned by Scanner.scan_columns().
+        """
+        if self._last_parse is not None:
+            self._stmt_cache = self._cache_statements(*self._last_parse)
+            self._last_parse = None
             
-            # Check if we've consumed all tokens
-            if self.current_token_index < len(self.tokens):
-                raise Exception(f"Unexpected token: {self.current_token}")
+        # Fast path: only re-parse the top-level statements that changed.
+        # Not worth it without a previous parse, or for a single statement.
+        ranges = self._split_statements(types) if self._stmt_cache else None
+        
+        try:
+            if ranges is not None and len(ranges) > 1:
+                self.syntax_tree = self._parse_incremental(values, types, ranges)
+            else:
+                self.syntax_tree = self._parse_program(values, types, 0, [])
+                self._stmt_cache = {}
+                self._last_parse = (values, types, self.syntax_tree.body.statements)
                 
             return True, self.syntax_tree
         except Exception as e:
             return False, str(e)
             
+    def _reset(self, values, types):
+        """
+        Point the parser at the start of the given token lists.
+        An EOF sentinel is appended so current_type is always a valid token type.
+        """
+        eof_value, eof_type = EOF_TOKEN
+        self.token_values = list(values) + [eof_value]
+        self.token_types = list(types) + [eof_type]
+        self.current_token_index = 0
+        self.current_type = self.token_types[0]
+        
+    def _parse_program(self, values, types, start, statements):
+        """
+        Parse the program from token index start on, where the top-level
+        statements before it have already been parsed into statements.
+        Raises an exception on a syntax error.
+        """
+        self._reset(values, types)
+        self.current_token_index = start
+        self.current_type = self.token_types[start]
+        
+        # Start parsing from the program rule
+        if start == 0:
+            tree = self.program()
+        else:
+            tree = Program(StmtSequence(statements + self.stmt_sequence().statements))
+            
+        # Check if we've consumed all tokens
+        if self.current_type != 'EOF':
+            raise Exception(f"Unexpected token: {self.current_token}")
+            
+        return tree
+        
+    def _cache_statements(self, values, types, statements):
+        """
+        Key the top-level statements of a previous parse by their tokens.
+        """
+        ranges = self._split_statements(types)
+        if ranges is None or len(ranges) != len(statements):
+            return {}
+            
+        return {
+            (tuple(values[start:end]), tuple(types[start:end])): stmt
+            for (start, end), stmt in zip(ranges, statements)
+        }
+        
+    def _parse_incremental(self, values, types, ranges):
+        """
+        Build the program tree by parsing each top-level statement on its own,
+        reusing the subtree from the previous parse when its tokens are unchanged.
+        From the first statement that does not parse on its own (e.g. a syntax
+        error) on, the rest of the program is parsed the regular way, so
+        errors are reported exactly as by a full parse.
+        """
+        statements = []
+        stmt_cache = {}
+        
+        for start, end in ranges:
+            key = (tuple(values[start:end]), tuple(types[start:end]))
+            stmt = self._stmt_cache.get(key) or stmt_cache.get(key)
+            
+            if stmt is None:
+                self._reset(values[start:end], types[start:end])
+                try:
+                    stmt = self.statement()
+                except Exception:
+                    stmt = None
+                    
+                # The statement must span its whole range
+                if stmt is None or self.current_type != 'EOF':
+                    return self._parse_program(values, types, start, statements)
+                    
+            stmt_cache[key] = stmt
+            statements.append(stmt)
+            
+        # Only keep the statements of the current program
+        self._stmt_cache = stmt_cache
+        
+        return Program(StmtSequence(statements))
+        
+    def _split_statements(self, types):
+        """
+        Return the (start, end) token ranges of the top-level statements, i.e.
+        split at every SEMICOLON outside of an if/repeat body.
+        Returns None if the if/end and repeat/until pairs are unbalanced.
+        """
+        ranges = []
+        depth = 0
+        start = 0
+        
+        for i, token_type in enumerate(types):
+            if token_type in Parser._BLOCK_OPENERS:
+                depth += 1
+            elif token_type in Parser._BLOCK_CLOSERS:
+                depth -= 1
+                if depth < 0:
+                    return None
+            elif token_type == 'SEMICOLON' and depth == 0:
+                ranges.append((start, i))
+                start = i + 1
+                
+        if depth != 0:
+            return None
+            
+        # A trailing semicolon does not start another statement
+        if start < len(types):
+            ranges.append((start, len(types)))
+            
+        return ranges
+        
     def match(self, expected_type):
         """
         Match the current token with the expected type.
-        If they match, consume the token and return it.
+        If they match, consume the token.
         Otherwise, raise an exception.
         """
-        if self.current_token_index >= len(self.tokens):
-            raise Exception("Unexpected end of input")
-            
-        token_value, token_type = self.current_token
+        token_type = self.current_type
         
         if token_type != expected_type:
+            if token_type == 'EOF':
+                raise Exception("Unexpected end of input")
             raise Exception(f"Expected {expected_type}, but found {token_type}")
             
-        # Consume the token
-        consumed_token = self.current_token
-        self.current_token_index += 1
-        self.current_token = self.tokens[self.current_token_index] if self.current_token_index < len(self.tokens) else None
+        self._consume()
         
-        return consumed_token
+    def _consume(self):
+        """
+        Consume the current token without checking its type.
+        Only for tokens whose type the caller has already checked, which
+        means it is never the EOF sentinel and the index stays in range.
+        """
+        i = self.current_token_index + 1
+        self.current_token_index = i
+        self.current_type = self.token_types[i]
         
     def program(self):
         """
         program -> stmt_sequence
         """
-        return {'type': 'program', 'body': self.stmt_sequence()}
+        return Program(self.stmt_sequence())
         
     def stmt_sequence(self):
         """
@@ -81,35 +332,28 @@ class Parser:
         """
         statements = [self.statement()]
         
-        while self.current_token and self.current_token[1] == 'SEMICOLON':
-            self.match('SEMICOLON')
-            if self.current_token and self.current_token[1] not in ['END', 'UNTIL']:
+        while self.current_type == 'SEMICOLON':
+            self._consume()
+            if self.current_type not in Parser._STMT_TERMS:
                 statements.append(self.statement())
             else:
                 break
                 
-        return {'type': 'stmt_sequence', 'statements': statements}
+        return StmtSequence(statements)
         
     def statement(self):
         """
         statement -> if_stmt | repeat_stmt | assign_stmt | read_stmt | write_stmt
         """
-        if not self.current_token:
+        token_type = self.current_type
+        
+        handler = self._STMT_DISPATCH.get(token_type)
+        if handler is not None:
+            return handler(self)
+        elif token_type == 'EOF':
             raise Exception("Unexpected end of input")
-            
-        token_value, token_type = self.current_token
-        
-        if token_type == 'IF':
-            return self.if_stmt()
-        elif token_type == 'REPEAT':
-            return self.repeat_stmt()
-        elif token_type == 'READ':
-            return self.read_stmt()
-        elif token_type == 'WRITE':
-            return self.write_stmt()
-        elif token_type == 'IDENTIFIER':
-            return self.assign_stmt()
         else:
+            token_value = self.token_values[self.current_token_index]
             raise Exception(f"Unexpected token: {token_value}, {token_type}")
             
     def if_stmt(self):
@@ -122,7 +366,7 @@ class Parser:
         body = self.stmt_sequence()
         self.match('END')
         
-        return {'type': 'if_stmt', 'condition': condition, 'body': body}
+        return IfStmt(condition, body)
         
     def repeat_stmt(self):
         """
@@ -133,26 +377,31 @@ class Parser:
         self.match('UNTIL')
         condition = self.exp()
         
-        return {'type': 'repeat_stmt', 'body': body, 'condition': condition}
+        return RepeatStmt(body, condition)
         
     def assign_stmt(self):
         """
         assign_stmt -> identifier := exp
         """
-        identifier = self.match('IDENTIFIER')
+        # Only dispatched here on an IDENTIFIER token
+        i = self.current_token_index
+        identifier = (self.token_values[i], 'IDENTIFIER')
+        self._consume()
         self.match('ASSIGN')
         value = self.exp()
         
-        return {'type': 'assign_stmt', 'identifier': identifier, 'value': value}
+        return AssignStmt(identifier, value)
         
     def read_stmt(self):
         """
         read_stmt -> read identifier
         """
         self.match('READ')
-        identifier = self.match('IDENTIFIER')
+        i = self.current_token_index
+        self.match('IDENTIFIER')
+        identifier = (self.token_values[i], 'IDENTIFIER')
         
-        return {'type': 'read_stmt', 'identifier': identifier}
+        return ReadStmt(identifier)
         
     def write_stmt(self):
         """
@@ -161,59 +410,34 @@ class Parser:
         self.match('WRITE')
         value = self.exp()
         
-        return {'type': 'write_stmt', 'value': value}
+        return WriteStmt(value)
         
-    def exp(self):
+    def exp(self, min_prec=1):
         """
         exp -> simple_exp [comparison_op simple_exp]
-        """
-        left = self.simple_exp()
-        
-        if self.current_token and self.current_token[1] in ['LESSTHAN', 'EQUAL']:
-            op = self.current_token
-            if op[1] == 'LESSTHAN':
-                self.match('LESSTHAN')
-            else:
-                self.match('EQUAL')
-                
-            right = self.simple_exp()
-            return {'type': 'exp', 'left': left, 'op': op, 'right': right}
-            
-        return left
-        
-    def simple_exp(self):
-        """
         simple_exp -> term {addop term}
-        """
-        left = self.term()
-        
-        while self.current_token and self.current_token[1] in ['PLUS', 'MINUS']:
-            op = self.current_token
-            if op[1] == 'PLUS':
-                self.match('PLUS')
-            else:
-                self.match('MINUS')
-                
-            right = self.term()
-            left = {'type': 'simple_exp', 'left': left, 'op': op, 'right': right}
-            
-        return left
-        
-    def term(self):
-        """
         term -> factor {mulop factor}
+        
+        Parsed by precedence climbing: one call per operator instead of one
+        per grammar level. Only operators binding at least as tightly as
+        min_prec are consumed. Builds the same exp/simple_exp/term nodes as
+        the grammar above.
         """
         left = self.factor()
+        prec = self._PRECEDENCE.get(self.current_type)
         
-        while self.current_token and self.current_token[1] in ['MULT', 'DIV']:
-            op = self.current_token
-            if op[1] == 'MULT':
-                self.match('MULT')
-            else:
-                self.match('DIV')
+        while prec is not None and prec >= min_prec:
+            i = self.current_token_index
+            op = (self.token_values[i], self.token_types[i])
+            self._consume()
+            right = self.exp(prec + 1)
+            left = self._PRECEDENCE_NODES[prec](left, op, right)
+            
+            # A comparison cannot be followed by another one
+            if prec == 1:
+                break
                 
-            right = self.factor()
-            left = {'type': 'term', 'left': left, 'op': op, 'right': right}
+            prec = self._PRECEDENCE.get(self.current_type)
             
         return left
         
@@ -221,35 +445,94 @@ class Parser:
         """
         factor -> (exp) | number | identifier
         """
-        if not self.current_token:
+        token_type = self.current_type
+        
+        handler = self._FACTOR_DISPATCH.get(token_type)
+        if handler is not None:
+            return handler(self)
+        elif token_type == 'EOF':
             raise Exception("Unexpected end of input")
-            
-        token_value, token_type = self.current_token
-        
-        if token_type == 'OPENBRACKET':
-            self.match('OPENBRACKET')
-            exp_value = self.exp()
-            self.match('CLOSEDBRACKET')
-            return {'type': 'factor', 'value': exp_value}
-        elif token_type == 'NUMBER':
-            return {'type': 'factor', 'value': self.match('NUMBER')}
-        elif token_type == 'IDENTIFIER':
-            return {'type': 'factor', 'value': self.match('IDENTIFIER')}
         else:
+            token_value = self.token_values[self.current_token_index]
             raise Exception(f"Unexpected token: {token_value}, {token_type}")
-
+            
+    def paren_factor(self):
+        """
+        factor -> (exp)
+        """
+        self.match('OPENBRACKET')
+        exp_value = self.exp()
+        self.match('CLOSEDBRACKET')
+        return Factor(exp_value)
+        
+    def number_factor(self):
+        """
+        factor -> number
+        """
+        i = self.current_token_index
+        self._consume()
+        return Factor((self.token_values[i], 'NUMBER'))
+        
+    def identifier_factor(self):
+        """
+        factor -> identifier
+        """
+        i = self.current_token_index
+        self._consume()
+        return Factor((self.token_values[i], 'IDENTIFIER'))
+        
     def parse_file(self, token_filename):
         """
         Parse a file containing tokens in the format: token_value,token_type
         """
-        tokens = []
+        values = []
+        types = []
         with open(token_filename, 'r') as file:
             for line in file:
                 line = line.strip()
                 if line:
                     token_value, token_type = line.split(',')
-                    tokens.append((token_value, token_type))
-        return self.parse(tokens)
+                    values.append(token_value)
+                    types.append(token_type)
+        return self.parse_columns(values, types)
+        
+    # Token types that open / close an if or repeat body
+    _BLOCK_OPENERS = frozenset({'IF', 'REPEAT'})
+    _BLOCK_CLOSERS = frozenset({'END', 'UNTIL'})
+    
+    # Token types that end a statement sequence after a semicolon
+    _STMT_TERMS = frozenset({'END', 'UNTIL', 'EOF'})
+    
+    # Rule to parse for each token type that can start a statement / factor
+    _STMT_DISPATCH = {
+        'IF': if_stmt,
+        'REPEAT': repeat_stmt,
+        'READ': read_stmt,
+        'WRITE': write_stmt,
+        'IDENTIFIER': assign_stmt,
+    }
+    
+    _FACTOR_DISPATCH = {
+        'OPENBRACKET': paren_factor,
+        'NUMBER': number_factor,
+        'IDENTIFIER': identifier_factor,
+    }
+    
+    # Binding strength of each binary operator, and the node built at each level
+    _PRECEDENCE = {
+        'LESSTHAN': 1,
+        'EQUAL': 1,
+        'PLUS': 2,
+        'MINUS': 2,
+        'MULT': 3,
+        'DIV': 3,
+    }
+    
+    _PRECEDENCE_NODES = {
+        1: Exp,
+        2: SimpleExp,
+        3: Term,
+    }
 
 # Example usage
 if __name__ == "__main__":
@@ -1,8 +1,8 @@
 import re
 
 # Token definitions
-TOKEN_TYPES = {
-    # Reserved words
+# Reserved words (TINY keywords are lowercase, so lookups are case-sensitive)
+_RESERVED = {
     'if': 'IF',
     'then': 'THEN',
     'end': 'END',
@@ -10,8 +10,10 @@ TOKEN_TYPES = {
     'until': 'UNTIL',
     'read': 'READ',
     'write': 'WRITE',
-    
-    # Special symbols
+}
+
+# Special symbols
+_SYMBOLS = {
     ';': 'SEMICOLON',
     ':=': 'ASSIGN',
     '<': 'LESSTHAN',
@@ -24,61 +26,83 @@ TOKEN_TYPES = {
     ')': 'CLOSEDBRACKET',
 }
 
+TOKEN_TYPES = {**_RESERVED, **_SYMBOLS}
+
+# Combined token pattern, compiled once and driven with finditer() so the
+# whole buffer is scanned in a single pass without slicing. Leading whitespace
+# is consumed as part of each token, so the regex engine rather than the Python
+# loop skips it; the WS alternative only matches whitespace at the very end.
+_TOKEN_RE = re.compile(
+    r'\s*(?:'
+    r'(?P<ID>[A-Za-z][A-Za-z0-9]*)'   # identifiers and reserved words
+    r'|(?P<NUM>\d+)'                  # numbers
+    r'|(?P<ASSIGN>:=)'                # assignment operator
+    r'|(?P<SYM>[;<=+\-*/()])'         # other special symbols
+    r')'
+    r'|(?P<WS>\s+)'                   # trailing whitespace
+)
+
 class Scanner:
-    def __init__(self):
+    def __init__(self, ignore_case=False):
+        """
+        Args:
+            ignore_case: Also recognize reserved words written in upper or
+                mixed case (e.g. READ, Then). Off by default since it costs
+                a lowercase copy of every identifier.
+        """
         self.tokens = []
+        self.ignore_case = ignore_case
         
     def scan(self, code):
         """
         Scan the input code and return a list of tokens.
         Each token is a tuple (token_value, token_type).
         """
-        self.tokens = []
+        values, types = self.scan_columns(code)
+        self.tokens = list(zip(values, types))
+        return self.tokens
+        
+    def scan_columns(self, code):
+        """
+        Scan the input code and return the tokens as two parallel lists,
+        (token_values, token_types), without building a tuple per token.
+        """
+        values = []
+        types = []
         position = 0
         
-        while position < len(code):
+        for match in _TOKEN_RE.finditer(code):
+            # Any gap between matches is a character no rule accepts
+            if match.start() != position:
+                raise Exception(f"Unrecognized token at position {position}: '{code[position]}'")
+            position = match.end()
+            
+            kind = match.lastgroup
+            value = match.group(kind)
+            
             # Skip whitespace
-            if code[position].isspace():
-                position += 1
+            if kind == 'WS':
                 continue
                 
-            # Check for identifiers (starts with letter, followed by letters or digits)
-            identifier_match = re.match(r'[a-zA-Z][a-zA-Z0-9]*', code[position:])
-            if identifier_match:
-                value = identifier_match.group(0)
+            if kind == 'ID':
                 # Check if it's a reserved word
-                if value.lower() in TOKEN_TYPES:
-                    token_type = TOKEN_TYPES[value.lower()]
-                else:
-                    token_type = 'IDENTIFIER'
-                self.tokens.append((value, token_type))
-                position += len(value)
-                continue
-                
-            # Check for numbers
-            number_match = re.match(r'\d+', code[position:])
-            if number_match:
-                value = number_match.group(0)
-                self.tokens.append((value, 'NUMBER'))
-                position += len(value)
-                continue
-                
-            # Check for assignment operator (:=)
-            if position + 1 < len(code) and code[position:position+2] == ':=':
-                self.tokens.append((':=', 'ASSIGN'))
-                position += 2
-                continue
-                
-            # Check for other special symbols
-            if code[position] in TOKEN_TYPES:
-                self.tokens.append((code[position], TOKEN_TYPES[code[position]]))
-                position += 1
-                continue
-                
-            # If we get here, we have an unrecognized token
+                token_type = _RESERVED.get(value, 'IDENTIFIER')
+                if self.ignore_case and token_type == 'IDENTIFIER':
+                    token_type = _RESERVED.get(value.lower(), 'IDENTIFIER')
+            elif kind == 'NUM':
+                token_type = 'NUMBER'
+            elif kind == 'ASSIGN':
+                token_type = 'ASSIGN'
+            else:
+                token_type = _SYMBOLS[value]
+            values.append(value)
+            types.append(token_type)
+            
+        # Trailing characters that no rule accepts
+        if position < len(code):
             raise Exception(f"Unrecognized token at position {position}: '{code[position]}'")
             
-        return self.tokens
+        return values, types
     
     def scan_file(self, filename):
         """
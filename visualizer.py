@@ -1,132 +1,408 @@
+"""
+Syntax tree visualizer for the TINY language.
+
+Draws the syntax tree built by the parser with matplotlib and
+saves it as a PNG image.
+
+Set the TINY_DISABLE_VIZ environment variable to 1, true or yes to skip
+visualization entirely, such as on CI or in batch runs where the image is
+never looked at. visualize() then renders nothing and returns None.
+"""
+
+import io
 import os
-import networkx as nx
-import matplotlib.pyplot as plt
+import hashlib
+import threading
+import multiprocessing
+import concurrent.futures
+from collections import deque
 import matplotlib
 matplotlib.use('Agg')  # Use non-interactive backend
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.collections import LineCollection
+
+from parser import Node
+
+def _visualization_disabled():
+    """
+    Return whether visualization is turned off through TINY_DISABLE_VIZ.
+    """
+    return os.environ.get("TINY_DISABLE_VIZ", "").strip().lower() in ("1", "true", "yes")
+
+# Worker process that draws and saves the figures, created on first use.
+# Matplotlib is not thread-safe, but separate processes are fine.
+_render_pool = None
+
+def _get_render_pool():
+    """
+    Return the shared rendering process pool, creating it if needed.
+    """
+    global _render_pool
+    if _render_pool is None:
+        # "spawn" since forking a process that runs Tk threads is unsafe
+        _render_pool = concurrent.futures.ProcessPoolExecutor(
+            max_workers=1, mp_context=multiprocessing.get_context("spawn"))
+    return _render_pool
+
+def _completed_future(fn, *args):
+    """
+    Call fn(*args) right away and return its outcome as a finished Future.
+    """
+    future = concurrent.futures.Future()
+    try:
+        future.set_result(fn(*args))
+    except Exception as e:
+        future.set_exception(e)
+    return future
+
+# Node appearances as (shape, color, size), indexed by category code
+_CATEGORIES = (
+    ("s", "#FDD9B5", 3000),  # statements: square/rectangle, peach color
+    ("o", "#E6E6FA", 2000),  # expressions: oval, light purple/lavender
+    ("o", "#ADD8E6", 2000),  # other nodes: oval, light blue
+)
+_STMT, _EXP, _OTHER = range(len(_CATEGORIES))
+
+# Figure and axes reused by every rendering in this process, created on first
+# use. The lock serializes renderings, which share them (and matplotlib is not
+# thread-safe anyway), e.g. in single-core mode.
+_figure = None
+_axes = None
+_figure_lock = threading.Lock()
+
+def _get_figure():
+    """
+    Return the shared figure and its axes, cleared for a new rendering.
+    Must be called with _figure_lock held.
+    """
+    global _figure, _axes
+    if _figure is None:
+        # Use the object-oriented API on a bare Agg canvas, bypassing pyplot's
+        # global figure manager
+        _figure = Figure(figsize=(12, 10))
+        FigureCanvasAgg(_figure)
+        _axes = _figure.add_subplot(111)
+        
+        # The axes fill the whole figure and their limits are set from the
+        # node positions, so no extra layout or tight-bbox pass is needed
+        _figure.subplots_adjust(left=0, right=1, bottom=0, top=1)
+    else:
+        # Drop the previous rendering's artists
+        _axes.clear()
+    _axes.set_axis_off()
+    return _figure, _axes
+
+def _render_png(edges, pos, node_labels, nodes, categories, dpi, fast):
+    """
+    Draw the graph into an in-memory PNG image.
+    Runs in the rendering process, so it only uses its (picklable) arguments.
+    See SyntaxTreeVisualizer.visualize() for dpi and fast.
+    
+    Returns:
+        The PNG image data, as bytes.
+    """
+    with _figure_lock:
+        fig, ax = _get_figure()
+        return _draw_png(fig, ax, edges, pos, node_labels, nodes, categories, dpi, fast)
+
+def _draw_png(fig, ax, edges, pos, node_labels, nodes, categories, dpi, fast):
+    """
+    Draw the graph on the given (empty) axes and save the figure as a PNG.
+    
+    Returns:
+        The PNG image data, as bytes.
+    """
+    # Draw the edges below the nodes, all in one collection
+    lines = LineCollection([(pos[u], pos[v]) for u, v in edges],
+                           colors="black", linewidths=1.0, zorder=1)
+    ax.add_collection(lines)
+    
+    # Draw the graph with custom node appearances, one call per category
+    artists = [lines]
+    for code, (shape, color, size) in enumerate(_CATEGORIES):
+        ids = [node for node, category in zip(nodes, categories) if category == code]
+        artists.append(ax.scatter([pos[n][0] for n in ids], [pos[n][1] for n in ids],
+                                  c=color, marker=shape, s=size, zorder=2))
+    
+    if fast:
+        # Skip anti-aliasing of the node and edge shapes
+        for artist in artists:
+            artist.set_antialiased(False)
+    
+    # Draw labels
+    for node, label in node_labels.items():
+        x, y = pos[node]
+        ax.text(x, y, label, fontsize=10, ha="center", va="center", zorder=3)
+    
+    # Fit the view to the node positions, with room for the node markers
+    xs = [x for x, y in pos.values()]
+    ys = [y for x, y in pos.values()]
+    width, height = fig.get_size_inches()
+    x_margin = _view_margin(max(xs) - min(xs), width)
+    y_margin = _view_margin(max(ys) - min(ys), height)
+    ax.set_xlim(min(xs) - x_margin, max(xs) + x_margin)
+    ax.set_ylim(min(ys) - y_margin, max(ys) + y_margin)
+    
+    # Save the figure with a white background
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format="png", dpi=dpi, facecolor='white')
+    
+    return buffer.getvalue()
+
+def _view_margin(span, length):
+    """
+    Return the margin, in data units, to leave around nodes spanning span
+    data units on an axis length inches long, so the largest node marker
+    fits. Marker sizes are fixed in points, so the margin grows with the
+    span: a margin m must satisfy m / (span + 2 * m) = radius / length.
+    """
+    # Half the side of the largest marker (its size is an area in points^2)
+    radius = max(size for shape, color, size in _CATEGORIES) ** 0.5 / 2 / 72
+    return max(0.5, radius * span / (length - 2 * radius))
+
+def _render_graph(edges, pos, node_labels, nodes, categories,
+                  output_path, hash_path, fingerprint, dpi, fast):
+    """
+    Draw the graph and save it to a file, then record the tree fingerprint.
+    Runs in the rendering process, so it only uses its (picklable) arguments.
+    
+    Returns:
+        The path to the rendered image file.
+    """
+    png = _render_png(edges, pos, node_labels, nodes, categories, dpi, fast)
+    
+    # Drop the old fingerprint first, so it can never end up paired with a
+    # different image if writing the new one fails
+    try:
+        os.remove(hash_path)
+    except FileNotFoundError:
+        pass
+    
+    # Write the whole image at once instead of letting matplotlib stream it
+    with open(output_path, "wb") as file:
+        file.write(png)
+    
+    with open(hash_path, "w") as file:
+        file.write(fingerprint)
+    
+    return output_path
 
 class SyntaxTreeVisualizer:
-    def __init__(self):
-        self.graph = None
+    def __init__(self, single_core=False):
+        """
+        Args:
+            single_core: Also draw and save the figures of visualize_async() in
+                this process instead of the rendering worker process (useful
+                for debugging and profiling).
+        """
+        self.single_core = single_core
+        # The graph, as the list of node IDs and (parent, child) edges
+        self._nodes = []
+        self._edges = []
         self.node_count = 0
         self.node_labels = {}
-        self.node_colors = {}
-        self.node_shapes = {}
+        # Appearance category code (an index into _CATEGORIES) of each node,
+        # parallel to _nodes
+        self._node_category = []
         
-    def visualize(self, syntax_tree, output_file="syntax_tree"):
+    def visualize(self, syntax_tree, output_file="syntax_tree", dpi=96, fast=False):
         """
-        Visualize the syntax tree using networkx and matplotlib.
+        Visualize the syntax tree using matplotlib.
         
         Args:
             syntax_tree: The syntax tree to visualize (as returned by the parser).
             output_file: The name of the output file (without extension).
+            dpi: Resolution of the image. The default suits an on-screen
+                preview; use e.g. 150 or more when exporting the image.
+            fast: Also turn off anti-aliasing, for the quickest preview.
+        
+        Returns:
+            The path to the rendered image file, or None if visualization is
+            disabled through the TINY_DISABLE_VIZ environment variable.
+        
+        If the output file already holds a rendering of an identical tree (as
+        recorded in the <output_file>.hash file next to it), it is reused as is.
+        
+        Drawing and saving happen in the calling process; see visualize_async()
+        to render in a worker process instead.
+        """
+        return self._visualize(syntax_tree, output_file, dpi, fast, in_process=True).result()
+        
+    def visualize_async(self, syntax_tree, output_file="syntax_tree", dpi=96, fast=False):
+        """
+        Same as visualize(), but only builds the graph in the calling thread.
+        Drawing and saving happen in the rendering process (unless the
+        visualizer was created with single_core=True).
+        
+        The rendering process is started with the "spawn" method, which
+        imports the main module again: a script that calls this must do so
+        under an `if __name__ == "__main__":` guard.
+        
+        Returns:
+            A concurrent.futures.Future that resolves to the path of the
+            rendered image file, or to None if visualization is disabled.
+        """
+        return self._visualize(syntax_tree, output_file, dpi, fast, in_process=self.single_core)
+        
+    def _visualize(self, syntax_tree, output_file, dpi, fast, in_process):
+        """
+        Implementation of visualize() and visualize_async(), drawing in this
+        process if in_process is true and in the rendering process otherwise.
         
         Returns:
-            The path to the rendered image file.
+            A concurrent.futures.Future, as returned by visualize_async().
+        """
+        if _visualization_disabled():
+            return _completed_future(lambda: None)
+        
+        output_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), f"{output_file}.png")
+        hash_path = os.path.splitext(output_path)[0] + ".hash"
+        
+        # The render settings are part of the fingerprint, as they change the image
+        fingerprint = hashlib.blake2b(repr((self._tree_fingerprint(syntax_tree), dpi, fast)).encode()).hexdigest()
+        if os.path.exists(output_path) and self._read_hash(hash_path) == fingerprint:
+            return _completed_future(lambda: output_path)
+            
+        # Build the graph from the syntax tree
+        self._reset_graph(syntax_tree)
+        
+        # Save the graph
+        return self._save_graph(output_path, hash_path, fingerprint, dpi, fast, in_process)
+        
+    def visualize_to_bytes(self, syntax_tree, dpi=96, fast=False):
+        """
+        Same as visualize(), but returns the PNG image data instead of
+        writing it to a file, for callers that consume the image in memory.
+        
+        Returns:
+            The PNG image data as bytes, or None if visualization is disabled
+            through the TINY_DISABLE_VIZ environment variable.
+        """
+        if _visualization_disabled():
+            return None
+        
+        self._reset_graph(syntax_tree)
+        
+        return _render_png(*self._render_args(), dpi, fast)
+        
+    def _reset_graph(self, syntax_tree):
+        """
+        Discard the previous graph and build a new one from the syntax tree.
         """
         self.node_count = 0
         self.node_labels = {}
-        self.node_colors = {}
-        self.node_shapes = {}
+        self._node_category = []
         
-        # Create a new directed graph
-        self.graph = nx.DiGraph()
+        # Start a new graph
+        self._nodes = []
+        self._edges = []
         
-        # Build the graph from the syntax tree
         self._build_graph(syntax_tree)
         
-        # Save the graph
-        output_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), f"{output_file}.png")
-        self._save_graph(output_path)
+    def _tree_fingerprint(self, node):
+        """
+        Reduce a syntax tree to nested tuples of node types and tokens.
+        
+        Args:
+            node: A node in the syntax tree, a list of nodes, or a token.
         
-        return output_path
+        Returns:
+            A tuple that is equal for two trees exactly when they would be
+            drawn the same way.
+        """
+        if isinstance(node, Node):
+            return (node.type,) + tuple(self._tree_fingerprint(getattr(node, field)) for field in node.__slots__)
+        if isinstance(node, list):
+            return tuple(self._tree_fingerprint(child) for child in node)
+        return node
+        
+    def _read_hash(self, hash_path):
+        """
+        Return the tree fingerprint stored at hash_path, or None if there is none.
+        """
+        try:
+            with open(hash_path, "r") as file:
+                return file.read()
+        except OSError:
+            return None
         
-    def _build_graph(self, node, parent_id=None):
+    # Children of each node type, in the order they are drawn
+    _CHILD_EXTRACTORS = {
+        "program": lambda n: [n.body],
+        "stmt_sequence": lambda n: n.statements,
+        "if_stmt": lambda n: [n.condition, n.body],
+        "repeat_stmt": lambda n: [n.body, n.condition],
+        "assign_stmt": lambda n: [n.value],
+        "write_stmt": lambda n: [n.value],
+        "exp": lambda n: [n.left, n.right],
+        "simple_exp": lambda n: [n.left, n.right],
+        "term": lambda n: [n.left, n.right],
+    }
+    
+    def _build_graph(self, root):
         """
-        Recursively build the graph from the syntax tree.
+        Build the graph from the syntax tree.
+        Walks the tree depth-first with an explicit stack, so node IDs are
+        assigned in pre-order without recursing.
         
         Args:
-            node: The current node in the syntax tree.
-            parent_id: The ID of the parent node (if any).
+            root: The root node of the syntax tree.
         
         Returns:
-            The ID of the current node.
+            The ID of the root node.
         """
-        if not node:
+        if not root:
             return None
             
-        # Generate a unique ID for this node
-        node_id = f"node_{self.node_count}"
-        self.node_count += 1
-        
-        # Create a label for this node
-        label = self._create_node_label(node)
-        self.node_labels[node_id] = label
-        
-        # Set node appearance based on type
-        self._set_node_appearance(node, node_id)
-        
-        # Add the node to the graph
-        self.graph.add_node(node_id)
-        
-        # If this node has a parent, add an edge
-        if parent_id:
-            self.graph.add_edge(parent_id, node_id)
-        
-        # Process child nodes
-        if node["type"] == "program":
-            self._build_graph(node["body"], node_id)
-        elif node["type"] == "stmt_sequence":
-            for stmt in node["statements"]:
-                self._build_graph(stmt, node_id)
-        elif node["type"] == "if_stmt":
-            # Create a condition node
-            cond_id = self._build_graph(node["condition"], node_id)
-            # Create a body node
-            self._build_graph(node["body"], node_id)
-        elif node["type"] == "repeat_stmt":
-            # Create a body node
-            self._build_graph(node["body"], node_id)
-            # Create a condition node
-            self._build_graph(node["condition"], node_id)
-        elif node["type"] == "assign_stmt":
-            # Create a value node for the right-hand side
-            self._build_graph(node["value"], node_id)
-        elif node["type"] == "write_stmt":
-            # Create a value node
-            self._build_graph(node["value"], node_id)
-        elif node["type"] == "exp":
-            # Create left and right operand nodes
-            self._build_graph(node["left"], node_id)
-            self._build_graph(node["right"], node_id)
-        elif node["type"] == "simple_exp":
-            # Create left and right operand nodes
-            self._build_graph(node["left"], node_id)
-            self._build_graph(node["right"], node_id)
-        elif node["type"] == "term":
-            # Create left and right operand nodes
-            self._build_graph(node["left"], node_id)
-            self._build_graph(node["right"], node_id)
-        
-        return node_id
+        root_id = None
+        stack = [(root, None)]
+        
+        while stack:
+            node, parent_id = stack.pop()
+            
+            # Generate a unique ID for this node (a plain int, cheap to hash)
+            node_id = self.node_count
+            self.node_count += 1
+            if root_id is None:
+                root_id = node_id
+            
+            # Create a label for this node
+            label = self._create_node_label(node)
+            self.node_labels[node_id] = label
+            
+            # Set node appearance based on type
+            self._set_node_appearance(node)
+            
+            # Add the node to the graph
+            self._nodes.append(node_id)
+            
+            # If this node has a parent, add an edge
+            if parent_id is not None:
+                self._edges.append((parent_id, node_id))
+            
+            # Queue the child nodes, reversed so the first child is visited next
+            children = self._CHILD_EXTRACTORS.get(node.type, lambda n: [])(node)
+            for child in reversed(children):
+                if child:
+                    stack.append((child, node_id))
+        
+        return root_id
     
-    def _set_node_appearance(self, node, node_id):
+    # Appearance category code of each node type; other types get _OTHER
+    _CATEGORY_OF_TYPE = {
+        "if_stmt": _STMT, "repeat_stmt": _STMT, "assign_stmt": _STMT,
+        "read_stmt": _STMT, "write_stmt": _STMT,
+        "exp": _EXP, "simple_exp": _EXP, "term": _EXP, "factor": _EXP,
+    }
+    
+    def _set_node_appearance(self, node):
         """
         Set the appearance of a node based on its type.
+        Statements are drawn as rectangular peach boxes, expressions as
+        lavender ovals and anything else as light blue ovals.
         """
-        node_type = node["type"]
-        
-        # Statements are rectangular orange/tan boxes
-        if node_type in ["if_stmt", "repeat_stmt", "assign_stmt", "read_stmt", "write_stmt"]:
-            self.node_shapes[node_id] = "s"  # square/rectangle
-            self.node_colors[node_id] = "#FDD9B5"  # peach color
-        # Expressions are oval purple nodes
-        elif node_type in ["exp", "simple_exp", "term", "factor"]:
-            self.node_shapes[node_id] = "o"  # oval
-            self.node_colors[node_id] = "#E6E6FA"  # light purple/lavender
-        else:
-            # Default shapes for other nodes
-            self.node_shapes[node_id] = "o"  # oval
-            self.node_colors[node_id] = "#ADD8E6"  # light blue
+        self._node_category.append(self._CATEGORY_OF_TYPE.get(node.type, _OTHER))
     
     def _create_node_label(self, node):
         """
@@ -138,7 +414,7 @@ class SyntaxTreeVisualizer:
         Returns:
             A string label for the node.
         """
-        node_type = node["type"]
+        node_type = node.type
         
         if node_type == "program":
             return "Program"
@@ -149,216 +425,178 @@ class SyntaxTreeVisualizer:
         elif node_type == "repeat_stmt":
             return "repeat"
         elif node_type == "assign_stmt":
-            return f"assign\n({node['identifier'][0]})"
+            return f"assign\n({node.identifier[0]})"
         elif node_type == "read_stmt":
-            return f"read ({node['identifier'][0]})"
+            return f"read ({node.identifier[0]})"
         elif node_type == "write_stmt":
             return "write"
-        elif node_type == "exp":
-            if "op" in node:
-                op_value = node['op'][0]
-                return f"OP ({op_value})"
-            else:
-                return "exp"
-        elif node_type == "simple_exp":
-            if "op" in node:
-                return f"OP ({node['op'][0]})"
-            else:
-                return "simple_exp"
-        elif node_type == "term":
-            if "op" in node:
-                return f"OP ({node['op'][0]})"
-            else:
-                return "term"
+        elif node_type in ("exp", "simple_exp", "term"):
+            # Only built for an actual operator, so op is always set
+            return f"OP ({node.op[0]})"
         elif node_type == "factor":
-            if isinstance(node["value"], dict):
+            if isinstance(node.value, Node):
                 return "Factor (Expression)"
             else:
-                if node["value"][1] == "NUMBER":
-                    return f"const ({node['value'][0]})"
+                if node.value[1] == "NUMBER":
+                    return f"const ({node.value[0]})"
                 else:
-                    return f"id ({node['value'][0]})"
+                    return f"id ({node.value[0]})"
         else:
             return node_type
     
-    def _save_graph(self, output_path):
+    def _save_graph(self, output_path, hash_path, fingerprint, dpi, fast, in_process):
         """
-        Save the graph to a file.
+        Lay out the graph and save it to a file.
         
         Args:
             output_path: The path to save the file to.
-        """
-        plt.figure(figsize=(12, 10))
+            hash_path: Where to record the fingerprint once the file is saved.
+            fingerprint: The tree fingerprint.
+            dpi: Resolution of the image.
+            fast: Whether to turn off anti-aliasing.
+            in_process: Draw in this process instead of the rendering process.
         
-        # Create a hierarchical layout manually since pygraphviz is not available
-        pos = self._custom_layout_for_factorial()
+        Returns:
+            A Future that resolves to output_path once the file is written.
+        """
+        args = self._render_args() + (output_path, hash_path, fingerprint, dpi, fast)
         
-        # Draw the graph with custom node appearances
-        for node in self.graph.nodes():
-            shape = self.node_shapes.get(node, "o")
-            color = self.node_colors.get(node, "#ADD8E6")
-            
-            if shape == 's':  # square/rectangle for statements
-                nx.draw_networkx_nodes(self.graph, pos, 
-                                      nodelist=[node],
-                                      node_color=color,
-                                      node_shape=shape,
-                                      node_size=3000)
-            else:  # oval for expressions
-                nx.draw_networkx_nodes(self.graph, pos, 
-                                      nodelist=[node],
-                                      node_color=color,
-                                      node_shape=shape,
-                                      node_size=2000)
-        
-        # Draw edges
-        nx.draw_networkx_edges(self.graph, pos, arrows=True, arrowsize=15)
-        
-        # Draw labels
-        nx.draw_networkx_labels(self.graph, pos, labels=self.node_labels, font_size=10)
-        
-        # Save the figure with a white background
-        plt.axis('off')
-        plt.tight_layout()
-        plt.savefig(output_path, dpi=150, bbox_inches='tight', facecolor='white')
-        plt.close()
+        if in_process:
+            return _completed_future(_render_graph, *args)
+        return _get_render_pool().submit(_render_graph, *args)
     
-    def _custom_layout_for_factorial(self):
+    def _render_args(self):
         """
-        Create a custom layout specifically designed for the factorial program syntax tree.
-        This layout matches more closely the example image shown.
+        Lay out the graph and return the leading arguments for the render
+        functions: the edges, node positions, labels, nodes and their
+        appearance categories.
         """
-        pos = {}
+        # Create a hierarchical layout manually since pygraphviz is not available
+        pos = self._create_hierarchical_layout()
         
-        # Find nodes based on their labels (this is a heuristic approach)
-        for node_id, label in self.node_labels.items():
-            # Position based on recognizable labels
-            if label == "read (x)":
-                pos[node_id] = (1, 6)
-            elif label == "if":
-                pos[node_id] = (3, 6)
-            elif label == "OP (<)":
-                pos[node_id] = (2, 5)
-            elif label == "const (0)":
-                pos[node_id] = (1, 4)
-            elif label == "id (x)":
-                if node_id.endswith("0") or node_id.endswith("5"):  # Heuristic for first x
-                    pos[node_id] = (3, 4)
-                else:
-                    # Position other x instances differently
-                    pos[node_id] = (5, 2)
-            elif label == "assign\n(fact)":
-                if node_id.startswith("node_1"):  # First assign fact
-                    pos[node_id] = (5, 6)
-                else:
-                    pos[node_id] = (3, 2)
-            elif label == "const (1)":
-                pos[node_id] = (6, 5)
-            elif label == "repeat":
-                pos[node_id] = (7, 6)
-            elif label == "OP (*)":
-                pos[node_id] = (4, 1)
-            elif label == "id (fact)":
-                if node_id.endswith("1") or node_id.endswith("2"):  # First fact reference
-                    pos[node_id] = (3, 0)
-                else:
-                    pos[node_id] = (9, 4)
-            elif label == "assign\n(x)":
-                pos[node_id] = (8, 2)
-            elif label == "OP (-)":
-                pos[node_id] = (8, 1)
-            elif label == "const (1)":
-                pos[node_id] = (9, 0)
-            elif label == "OP (=)":
-                pos[node_id] = (8, 5)
-            elif label == "const (0)":
-                pos[node_id] = (9, 4)
-            elif label == "write":
-                pos[node_id] = (11, 6)
-            else:
-                # Default position for unrecognized nodes
-                pos[node_id] = (0, 0)
-        
-        # If any node doesn't have a position yet, use a fallback algorithm
-        if len(pos) < len(self.graph.nodes()):
-            fallback_pos = self._create_hierarchical_layout()
-            for node in self.graph.nodes():
-                if node not in pos:
-                    pos[node] = fallback_pos.get(node, (0, 0))
-                    
-        return pos
+        return (self._edges, pos, self.node_labels, self._nodes, self._node_category)
     
-    def _create_hierarchical_layout(self):
+    def _create_hierarchical_layout(self, min_gap=1.0):
         """
         Create a hierarchical layout for the graph manually.
-        This is a simple implementation that places nodes in layers based on their distance from the root.
+        Nodes are placed in layers based on their distance from the root, then
+        ordered within each layer Sugiyama-style: a top-down sweep centers
+        each node under its parents and a bottom-up sweep centers each node
+        over its children, resolving overlaps after every layer.
+        
+        Args:
+            min_gap: The minimum horizontal distance between two nodes in the
+                same layer.
+        
+        Returns:
+            A dict mapping each node to its (x, y) position.
         """
+        # Build the adjacency lists once from the edge list
+        children_of = {node: [] for node in self._nodes}
+        parents_of = {node: [] for node in self._nodes}
+        for parent, child in self._edges:
+            children_of[parent].append(child)
+            parents_of[child].append(parent)
+        
         # Find the root node (node with no incoming edges)
         root = None
-        for node in self.graph.nodes():
-            if self.graph.in_degree(node) == 0:
+        for node in self._nodes:
+            if not parents_of[node]:
                 root = node
                 break
                 
-        if not root:
+        if root is None:
             # If no root found (e.g., cyclic graph), use the first node
-            root = list(self.graph.nodes())[0]
+            root = self._nodes[0]
             
         # Compute the level of each node (distance from root)
         levels = {root: 0}
-        nodes_by_level = {0: [root]}
+        nodes_by_level = [[root]]
         
         # BFS to assign levels
-        queue = [root]
+        queue = deque([root])
         visited = {root}
         
         while queue:
-            current = queue.pop(0)
+            current = queue.popleft()
             current_level = levels[current]
             
-            for neighbor in self.graph.successors(current):
+            for neighbor in children_of[current]:
                 if neighbor not in visited:
                     levels[neighbor] = current_level + 1
-                    if current_level + 1 not in nodes_by_level:
-                        nodes_by_level[current_level + 1] = []
+                    if current_level + 1 == len(nodes_by_level):
+                        nodes_by_level.append([])
                     nodes_by_level[current_level + 1].append(neighbor)
                     queue.append(neighbor)
                     visited.add(neighbor)
-                    
-        # Determine the maximum level and number of nodes per level
-        max_level = max(levels.values()) if levels else 0
         
-        # Create positions
-        pos = {}
-        y_spacing = 1.0
-        
-        # Position nodes by level (top to bottom)
-        for level in range(max_level + 1):
-            if level not in nodes_by_level:
-                continue
-                
-            nodes = nodes_by_level[level]
-            n_nodes = len(nodes)
-            
-            # Position nodes horizontally with even spacing
-            x_spacing = 1.0 if n_nodes > 1 else 0.5
-            total_width = x_spacing * (n_nodes - 1) if n_nodes > 1 else 0
-            start_x = -total_width / 2
-            
+        # Initial positions: nodes spaced evenly in BFS order
+        x = {}
+        for nodes in nodes_by_level:
             for i, node in enumerate(nodes):
-                pos[node] = (start_x + i * x_spacing, -level * y_spacing)
+                x[node] = i * min_gap
+        
+        # Top-down sweep: place each node under the mean of its parents
+        for level in range(1, len(nodes_by_level)):
+            for node in nodes_by_level[level]:
+                parents = [p for p in parents_of[node] if levels.get(p) == level - 1]
+                if parents:
+                    x[node] = sum(x[p] for p in parents) / len(parents)
+            self._spread_layer(nodes_by_level[level], x, min_gap)
+        
+        # Bottom-up sweep: place each node over the mean of its children
+        for level in range(len(nodes_by_level) - 2, -1, -1):
+            for node in nodes_by_level[level]:
+                children = [c for c in children_of[node] if levels.get(c) == level + 1]
+                if children:
+                    x[node] = sum(x[c] for c in children) / len(children)
+            self._spread_layer(nodes_by_level[level], x, min_gap)
+        
+        # Create positions, top to bottom
+        y_spacing = 1.0
+        pos = {}
+        for level, nodes in enumerate(nodes_by_level):
+            for node in nodes:
+                pos[node] = (x[node], -level * y_spacing)
                 
         return pos
+    
+    def _spread_layer(self, nodes, x, min_gap):
+        """
+        Order the nodes of a layer by their tentative x positions and push
+        them apart so that neighbours are at least min_gap apart, keeping the
+        layer centered where the tentative positions put it.
+        
+        Args:
+            nodes: The nodes of the layer; reordered in place.
+            x: A dict of tentative x positions, updated in place.
+            min_gap: The minimum distance between neighbouring nodes.
+        """
+        # A stable sort, so siblings sharing a parent keep their order
+        nodes.sort(key=x.__getitem__)
+        
+        placed = []
+        for node in nodes:
+            if placed:
+                placed.append(max(x[node], placed[-1] + min_gap))
+            else:
+                placed.append(x[node])
+        
+        # Shift the whole layer back by its average displacement
+        shift = sum(p - x[node] for p, node in zip(placed, nodes)) / len(nodes)
+        for p, node in zip(placed, nodes):
+            x[node] = p - shift
 
 # Example usage
 if __name__ == "__main__":
     from scanner import Scanner
     from parser import Parser
     import os
+    import sys
     
     scanner = Scanner()
     parser = Parser()
-    visualizer = SyntaxTreeVisualizer()
+    visualizer = SyntaxTreeVisualizer(single_core="--singlecore" in sys.argv)
     
     # Example code - factorial program
     factorial_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "examples", "factorial.tiny")
@@ -372,8 +610,9 @@ if __name__ == "__main__":
         success, tree = parser.parse(tokens)
         
         if success:
-            # Visualize the syntax tree
-            output_path = visualizer.visualize(tree)
+            # Visualize the syntax tree, in the rendering process unless
+            # --singlecore is given
+            output_path = visualizer.visualize_async(tree).result()
             print(f"Syntax tree visualization saved to: {output_path}")
         else:
             print(f"Parsing failed: {tree}")